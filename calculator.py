@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def add(a, b):
     return a + b
 
@@ -8,10 +11,20 @@ def multiply(a, b):
     return a * b
 
 def divide(a, b):
+    return a / b
+
+def safe_divide(a, b):
     if b == 0:
         raise ValueError("Division by zero")
     return a / b
 
+def divide_array(a, b):
+    # 逐元素相除, 除数为 0 的位置结果为 NaN
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    out = np.full(np.broadcast(a, b).shape, np.nan)
+    return np.divide(a, b, out=out, where=b != 0)
+
 def power(a, b):
     return a ** b
 
@@ -32,6 +45,7 @@ if __name__ == "__main__":
     
     # Test exception handling
     try:
-        divide(5, 0)
+        safe_divide(5, 0)
     except ValueError as e:
-        print("divide(5, 0) raised:", e)
+        print("safe_divide(5, 0) raised:", e)
+    print("divide_array([1, 2, 3], [1, 0, 2]) =", divide_array([1, 2, 3], [1, 0, 2]))
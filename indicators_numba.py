@@ -0,0 +1,139 @@
+"""
+Numba kernels for the trading system
+Single-pass indicator computation returning only the latest values
+"""
+
+try:
+    from numba import njit, types
+    NUMBA_AVAILABLE = True
+    # 显式签名用只读连续数组: pandas 写时复制下 to_numpy 给出的是只读数组,
+    # 可写数组也能匹配, 这样每个函数只编译一个版本, 并在导入时从磁盘缓存加载
+    F4 = types.Array(types.float32, 1, 'C', readonly=True)
+    F8 = types.Array(types.float64, 1, 'C', readonly=True)
+    F8_2D = types.Array(types.float64, 2, 'C', readonly=True)
+except ImportError:
+    NUMBA_AVAILABLE = False
+    F4 = F8 = F8_2D = None
+
+    def njit(*args, **kwargs):
+        """numba 未安装时的空装饰器, 函数按普通 Python 执行"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+import numpy as np
+
+
+# compute_all 返回元组中各字段的顺序
+LATEST_FIELDS = (
+    'close', 'prev_close', 'volume',
+    'rsi', 'macd', 'macd_signal', 'macd_hist',
+    'kdj_k', 'kdj_d', 'kdj_j',
+    'ma5', 'ma20', 'ma60', 'bb_upper', 'bb_lower',
+    'vol_ma', 'atr',
+    'resistance_1', 'resistance_2', 'support_1', 'support_2',
+)
+
+
+# 价格一般为 float32; 价格超出 float32 精度范围的股票 (如 BRK-A) 传 float64
+@njit([(F4, F4, F4, F8), (F8, F8, F8, F8)], cache=True, fastmath=True)
+def compute_all(high, low, close, volume):
+    """单次遍历算出全部指标的最新值, 按 LATEST_FIELDS 顺序返回; 要求至少 60 根K线"""
+    n = len(close)
+    rsi_n = 14
+    kdj_n = 9
+    a_fast = 2 / 13
+    a_slow = 2 / 27
+    a_signal = 2 / 10
+    a_kdj = 1 / 3
+
+    avg_gain = 0.0
+    avg_loss = 0.0
+    e_fast = float(close[0])
+    e_slow = e_fast
+    sig = 0.0
+    k = 50.0
+    d = 50.0
+    for i in range(n):
+        c = float(close[i])
+
+        # RSI (Wilder RMA) 与 MACD 递推, 只保留状态不保留序列
+        if i > 0:
+            delta = c - float(close[i - 1])
+            gain = max(delta, 0.0)
+            loss = max(-delta, 0.0)
+            if i <= rsi_n:
+                avg_gain += gain
+                avg_loss += loss
+                if i == rsi_n:
+                    avg_gain /= rsi_n
+                    avg_loss /= rsi_n
+            else:
+                avg_gain = (avg_gain * (rsi_n - 1) + gain) / rsi_n
+                avg_loss = (avg_loss * (rsi_n - 1) + loss) / rsi_n
+            e_fast = a_fast * c + (1 - a_fast) * e_fast
+            e_slow = a_slow * c + (1 - a_slow) * e_slow
+            sig = a_signal * (e_fast - e_slow) + (1 - a_signal) * sig
+
+        # KDJ: 窗口只有 9, 直接扫描求最高/最低
+        rsv = 50.0
+        if i >= kdj_n - 1:
+            hh = float(high[i])
+            ll = float(low[i])
+            for t in range(i - kdj_n + 1, i):
+                hh = max(hh, float(high[t]))
+                ll = min(ll, float(low[t]))
+            if hh > ll:
+                rsv = (c - ll) / (hh - ll) * 100
+        if i == 0:
+            k = rsv
+            d = rsv
+        else:
+            k = a_kdj * rsv + (1 - a_kdj) * k
+            d = a_kdj * k + (1 - a_kdj) * d
+
+    if n <= rsi_n:
+        rsi = np.nan
+    elif avg_loss == 0:
+        rsi = 100.0
+    else:
+        rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    macd = e_fast - e_slow
+
+    # 以下只依赖最后一个窗口
+    s5 = 0.0
+    for t in range(n - 5, n):
+        s5 += close[t]
+    s60 = 0.0
+    for t in range(n - 60, n):
+        s60 += close[t]
+    s20 = 0.0
+    v20 = 0.0
+    hi20 = float(close[n - 20])
+    lo20 = hi20
+    for t in range(n - 20, n):
+        s20 += close[t]
+        v20 += volume[t]
+        hi20 = max(hi20, float(close[t]))
+        lo20 = min(lo20, float(close[t]))
+    ma20 = s20 / 20
+    ss20 = 0.0
+    for t in range(n - 20, n):
+        ss20 += (close[t] - ma20) ** 2
+    bb_std = np.sqrt(ss20 / 19)
+
+    tr_sum = 0.0
+    for t in range(n - 14, n):
+        tr = float(high[t]) - float(low[t])
+        if t > 0:
+            prev = float(close[t - 1])
+            tr = max(tr, abs(float(high[t]) - prev), abs(float(low[t]) - prev))
+        tr_sum += tr
+
+    diff = hi20 - lo20
+    return (float(close[n - 1]), float(close[n - 2]), float(volume[n - 1]),
+            rsi, macd, sig, macd - sig,
+            k, d, 3 * k - 2 * d,
+            s5 / 5, ma20, s60 / 60, ma20 + 2 * bb_std, ma20 - 2 * bb_std,
+            v20 / 20, tr_sum / 14,
+            hi20, hi20 - diff * 0.382, lo20, lo20 + diff * 0.382)
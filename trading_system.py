@@ -5,94 +5,413 @@ Version 2.1 - Added KDJ, Support/Resistance
 """
 
 import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+try:
+    import bottleneck as bn
+except ImportError:
+    bn = None
 from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from math import isnan
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
 
+from indicators_numba import njit, NUMBA_AVAILABLE, F8_2D, LATEST_FIELDS, compute_all
 
-def get_stock_data(symbol, period="1y"):
-    """获取股票数据"""
+# scipy 只在没有 numba 时用于 EWM, 有 numba 时不导入, 以免拖慢启动
+lfilter = None
+if not NUMBA_AVAILABLE:
+    try:
+        from scipy.signal import lfilter
+    except ImportError:
+        pass
+
+
+CACHE_DIR = Path.home() / ".cache" / "stock_trader"
+# 美股交易时段以纽约时间计; 盘中数据还在变化, 缓存只保留 CACHE_TTL
+MARKET_TZ = ZoneInfo("America/New_York")
+CACHE_TTL = timedelta(minutes=15)
+
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close')
+# float32 在 2**17 以上的相邻间距超过 1 分钱, 价格达到此值的股票保留 float64
+FLOAT32_PRICE_LIMIT = 2 ** 17
+
+# 最长指标窗口 (MA60) 所需的最少K线数量
+MIN_HISTORY = 60
+
+
+def _backoff_delay(attempt, initial=1, maximum=30):
+    """指数退避 + 随机抖动, 避免多个线程同时重试"""
+    return min(maximum, initial * 2 ** attempt) + random.uniform(0, 1)
+
+
+def _prices_to_float32(df):
+    """价格列在入口处转为 float32, 成交量保持原样;
+    float32 只有在 FLOAT32_PRICE_LIMIT 以下才能精确到分, 价格更高的 (如 BRK-A) 保留 float64"""
+    cols = [col for col in PRICE_COLUMNS if col in df.columns]
+    if not df[cols].max().max() < FLOAT32_PRICE_LIMIT:
+        return df
+    return df.astype({col: np.float32 for col in cols})
+
+
+def _cache_is_fresh(mtime):
+    """缓存是否仍然有效: 盘中写入的只在 CACHE_TTL 内有效, 其余须写于最近一次收盘之后"""
+    now = datetime.now(MARKET_TZ)
+    written = datetime.fromtimestamp(mtime, MARKET_TZ)
+    minutes = now.hour * 60 + now.minute
+    if now.weekday() < 5 and 9 * 60 + 30 <= minutes < 16 * 60:
+        return now - written < CACHE_TTL
+    # 最近一次收盘: 当天 16:00 之前取前一天, 再跳过周末 (节假日不单独处理, 最多多下载一次)
+    last_close = now.replace(hour=16, minute=0, second=0, microsecond=0)
+    if now < last_close:
+        last_close -= timedelta(days=1)
+    while last_close.weekday() >= 5:
+        last_close -= timedelta(days=1)
+    return written >= last_close
+
+
+def _read_cache(symbol, period):
+    """读取仍有效的 parquet 缓存, 没有、已过期或文件损坏时返回 None"""
+    path = CACHE_DIR / f"{symbol}_{period}.parquet"
+    try:
+        if not _cache_is_fresh(path.stat().st_mtime):
+            return None
+        return pd.read_parquet(path)
+    except FileNotFoundError:
+        return None
+    except ImportError:
+        return None  # 没有 parquet 引擎, 视同未缓存
+    except (ValueError, OSError):
+        # 文件损坏 (如写到一半被中断): 删掉, 按未命中处理
+        path.unlink(missing_ok=True)
+        return None
+
+
+def _write_cache(symbol, period, df):
+    """写入 parquet 缓存: 先写同目录下的临时文件再原子替换, 读者不会看到写了一半的文件"""
+    tmp = None
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        os.close(fd)
+        df.to_parquet(tmp)
+        os.replace(tmp, CACHE_DIR / f"{symbol}_{period}.parquet")
+    except (ImportError, OSError):
+        # 缓存写入失败不影响本次结果
+        if tmp is not None:
+            Path(tmp).unlink(missing_ok=True)
+
+
+def get_stock_data(symbol, period="1y", max_attempts=5):
+    """获取股票数据 (缓存有效时直接读本地 parquet, 被限流时退避重试)"""
+    df = _read_cache(symbol, period)
+    if df is not None:
+        return df
     stock = yf.Ticker(symbol)
-    df = stock.history(period=period)
+    for attempt in range(max_attempts):
+        try:
+            df = stock.history(period=period)
+            break
+        except YFRateLimitError:
+            # 其他错误 yfinance 内部已吞掉并返回空表, 只有限流值得重试
+            if attempt == max_attempts - 1:
+                return None
+            time.sleep(_backoff_delay(attempt))
     if df.empty:
         return None
-    df['Symbol'] = symbol
+    df = _prices_to_float32(df)
+    _write_cache(symbol, period, df)
     return df
 
 
+def get_many(symbols, period="1y"):
+    """批量获取多只股票数据, 返回 {symbol: df}, 取不到的为 None;
+    缓存有效的直接读本地, 其余合并成一次请求, 下载后按股票拆开分别写入缓存"""
+    frames = {symbol: _read_cache(symbol, period) for symbol in symbols}
+    pending = [symbol for symbol in symbols if frames[symbol] is None]
+    if not pending:
+        return frames
+    data = yf.download(pending, period=period, group_by="ticker",
+                       threads=True, progress=False)
+    for symbol in pending:
+        df = None
+        if data is not None and not data.empty:
+            if isinstance(data.columns, pd.MultiIndex):
+                # yf.download 会把代码转成大写, 结果的第一层列名是大写代码
+                if symbol.upper() in data.columns.get_level_values(0):
+                    df = data[symbol.upper()]
+            elif len(pending) == 1:
+                df = data
+        if df is not None:
+            # 各股票交易日不完全相同, 合并结果里会留下整行缺失
+            df = _prices_to_float32(df.dropna())
+        if df is not None and not df.empty:
+            _write_cache(symbol, period, df)
+            frames[symbol] = df
+    return frames
+
+
+@njit(cache=True, fastmath=True)
+def _rma_rsi(delta, n):
+    """Wilder RMA 平滑的 RSI, delta[0] 为占位, 前 n 个位置为 NaN"""
+    out = np.empty_like(delta)
+    out[:n] = np.nan
+    if len(delta) <= n:
+        out[:] = np.nan
+        return out
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, n + 1):
+        d = delta[i]
+        if d > 0:
+            avg_gain += d
+        else:
+            avg_loss -= d
+    avg_gain /= n
+    avg_loss /= n
+    for i in range(n, len(delta)):
+        if i > n:
+            d = delta[i]
+            avg_gain = (avg_gain * (n - 1) + max(d, 0.0)) / n
+            avg_loss = (avg_loss * (n - 1) - min(d, 0.0)) / n
+        if avg_loss == 0:
+            out[i] = 100.0
+        else:
+            out[i] = 100 - 100 / (1 + avg_gain / avg_loss)
+    return out
+
+
 def calculate_rsi(prices, period=14):
-    """计算RSI指标"""
-    delta = prices.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+    """计算RSI指标 (Wilder RMA 平滑, 输入输出均为 numpy 数组)"""
+    arr = np.asarray(prices, dtype=np.float64)
+    delta = np.diff(arr, prepend=arr[0])
+    return _rma_rsi(delta, period)
+
+
+def rsi_last(close, period=14):
+    """只求最新 RSI, 输入为 numpy 数组; 与 calculate_rsi 共用 _rma_rsi 的递推"""
+    if len(close) <= period:
+        return np.nan
+    arr = close.astype(np.float64)
+    return float(_rma_rsi(np.diff(arr, prepend=arr[0]), period)[-1])
+
+
+@njit(cache=True, fastmath=True)
+def _macd(c, a_fast, a_slow, a_signal):
+    """单次遍历同时递推快/慢 EMA 和信号线"""
+    macd = np.empty_like(c)
+    sig = np.empty_like(c)
+    if len(c) == 0:
+        return macd, sig, macd - sig
+    e_fast = c[0]
+    e_slow = c[0]
+    macd[0] = 0.0
+    sig[0] = 0.0
+    for i in range(1, len(c)):
+        e_fast = a_fast * c[i] + (1 - a_fast) * e_fast
+        e_slow = a_slow * c[i] + (1 - a_slow) * e_slow
+        macd[i] = e_fast - e_slow
+        sig[i] = a_signal * macd[i] + (1 - a_signal) * sig[i - 1]
+    return macd, sig, macd - sig
 
 
 def calculate_macd(prices, fast=12, slow=26, signal=9):
-    """计算MACD指标"""
-    ema_fast = prices.ewm(span=fast, adjust=False).mean()
-    ema_slow = prices.ewm(span=slow, adjust=False).mean()
-    macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    histogram = macd_line - signal_line
-    return macd_line, signal_line, histogram
+    """计算MACD指标 (输入输出均为 numpy 数组)"""
+    arr = np.asarray(prices, dtype=np.float64)
+    if NUMBA_AVAILABLE or lfilter is None:
+        macd, sig, hist = _macd(arr, 2 / (fast + 1), 2 / (slow + 1), 2 / (signal + 1))
+    else:
+        macd = _ewm(arr, 2 / (fast + 1)) - _ewm(arr, 2 / (slow + 1))
+        sig = _ewm(macd, 2 / (signal + 1))
+        hist = macd - sig
+    return macd, sig, hist
+
+
+# 以下滑动窗口函数优先使用 bottleneck 的 C 实现, 未安装时退回 numpy;
+# 结果前 window-1 个位置均为 NaN
+
+def _rolling_mean(arr, window):
+    """滑动均值"""
+    out = np.full(len(arr), np.nan)
+    if len(arr) < window:
+        return out
+    if bn is not None:
+        return bn.move_mean(arr, window, min_count=window)
+    csum = np.cumsum(arr, dtype=np.float64)
+    out[window - 1] = csum[window - 1] / window
+    out[window:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def _rolling_std(arr, window, ddof=1):
+    """滑动标准差 (默认样本标准差, 与 pandas rolling().std() 一致)"""
+    out = np.full(len(arr), np.nan)
+    if len(arr) < window:
+        return out
+    if bn is not None:
+        # bottleneck 对 float32 的方差累加精度很差, 统一升到 float64
+        return bn.move_std(np.asarray(arr, dtype=np.float64), window, min_count=window, ddof=ddof)
+    out[window - 1:] = sliding_window_view(arr, window).std(axis=1, ddof=ddof)
+    return out
+
+
+def _rolling_max(arr, window):
+    """滑动窗口最大值"""
+    out = np.full(len(arr), np.nan)
+    if len(arr) < window:
+        return out
+    if bn is not None:
+        return bn.move_max(arr, window, min_count=window)
+    out[window - 1:] = sliding_window_view(arr, window).max(axis=1)
+    return out
+
+
+def _rolling_min(arr, window):
+    """滑动窗口最小值"""
+    out = np.full(len(arr), np.nan)
+    if len(arr) < window:
+        return out
+    if bn is not None:
+        return bn.move_min(arr, window, min_count=window)
+    out[window - 1:] = sliding_window_view(arr, window).min(axis=1)
+    return out
+
+
+@njit(cache=True, fastmath=True)
+def _ewm_loop(x, alpha):
+    """逐点递推的 EWM, 由 numba 编译"""
+    out = np.empty_like(x)
+    if len(x) == 0:
+        return out
+    out[0] = x[0]
+    for i in range(1, len(x)):
+        out[i] = alpha * x[i] + (1 - alpha) * out[i - 1]
+    return out
+
+
+def _ewm(x, alpha):
+    """等价于 ewm(alpha=alpha, adjust=False).mean()"""
+    if NUMBA_AVAILABLE or lfilter is None or len(x) == 0:
+        return _ewm_loop(x, alpha)
+    # 没有 numba 时用 scipy 的一阶 IIR 滤波代替 Python 循环, zi 使首项等于 x[0]
+    return lfilter([alpha], [1, alpha - 1], x, zi=[x[0] * (1 - alpha)])[0]
+
+
+def _ema_weights(n, span):
+    """长度为 n 的序列做 ewm(span, adjust=False) 后, 末值对各输入的权重"""
+    a = 2 / (span + 1)
+    w = (1 - a) ** np.arange(n - 1, -1, -1)
+    w[1:] *= a
+    return w
+
+
+def mean_last(x, window):
+    """只求最后一个窗口的均值, O(window)"""
+    return float(x[-window:].mean(dtype=np.float64))
+
+
+@lru_cache(maxsize=32)
+def _macd_weights(n, fast, slow, signal):
+    """MACD 线与信号线末值对收盘价的权重向量, 按序列长度缓存"""
+    w_macd = _ema_weights(n, fast) - _ema_weights(n, slow)
+    # 信号线是 MACD 序列的 EMA, 末值权重需要把信号线权重回代到收盘价上:
+    # 对快/慢 EMA 各做一次反向递推 r[i] = v[i] + (1-a) * r[i+1]
+    v = _ema_weights(n, signal)
+    w_signal = np.zeros(n)
+    for span, sign in ((fast, 1), (slow, -1)):
+        a = 2 / (span + 1)
+        r = 0.0
+        for i in range(n - 1, -1, -1):
+            r = v[i] + (1 - a) * r
+            w_signal[i] += sign * (r if i == 0 else a * r)
+    return w_macd, w_signal
+
+
+def macd_last(prices, fast=12, slow=26, signal=9):
+    """只求 MACD/信号线/柱状图的最新值, 用于不需要完整序列的场景"""
+    w_macd, w_signal = _macd_weights(len(prices), fast, slow, signal)
+    macd = float(w_macd @ prices)
+    sig = float(w_signal @ prices)
+    return macd, sig, macd - sig
 
 
 def calculate_kdj(high, low, close, n=9, m1=3, m2=3):
-    """计算KDJ指标"""
-    lowest_low = low.rolling(window=n).min()
-    highest_high = high.rolling(window=n).max()
+    """计算KDJ指标 (输入输出均为 numpy 数组)"""
+    high, low, close = (np.asarray(x) for x in (high, low, close))
+    lowest_low = _rolling_min(low, n)
+    highest_high = _rolling_max(high, n)
     
-    rsv = (close - lowest_low) / (highest_high - lowest_low) * 100
-    rsv = rsv.fillna(50)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = (close - lowest_low) / (highest_high - lowest_low) * 100
+    rsv = np.where(np.isnan(rsv), 50.0, rsv)
     
-    k = rsv.ewm(alpha=1/m1, adjust=False).mean()
-    d = k.ewm(alpha=1/m2, adjust=False).mean()
+    k = _ewm(rsv, 1 / m1)
+    d = _ewm(k, 1 / m2)
     j = 3 * k - 2 * d
     
     return k, d, j
 
 
 def calculate_ma(prices, periods=[5, 20, 60]):
-    """计算移动平均线"""
+    """计算移动平均线 (输入为 numpy 数组, 返回 {'MA5': 数组, ...})"""
+    arr = np.asarray(prices)
     ma_dict = {}
     for period in periods:
-        ma_dict[f'MA{period}'] = prices.rolling(window=period).mean()
+        ma_dict[f'MA{period}'] = _rolling_mean(arr, period)
     return ma_dict
 
 
 def calculate_bollinger_bands(prices, period=20, std_dev=2):
-    """计算布林带"""
-    ma = prices.rolling(window=period).mean()
-    std = prices.rolling(window=period).std()
+    """计算布林带 (输入输出均为 numpy 数组)"""
+    arr = np.asarray(prices)
+    ma = _rolling_mean(arr, period)
+    std = _rolling_std(arr, period)
     upper_band = ma + (std * std_dev)
     lower_band = ma - (std * std_dev)
     return upper_band, ma, lower_band
 
 
-def calculate_atr(df, period=14):
-    """计算ATR (Average True Range) 波动率指标"""
-    high = df['High']
-    low = df['Low']
-    close = df['Close']
-    
-    tr1 = high - low
-    tr2 = abs(high - close.shift(1))
-    tr3 = abs(low - close.shift(1))
+def rowwise_max(*arrs):
+    """多个等长数组逐元素取最大值, 忽略 NaN (同 pandas concat(axis=1).max(axis=1)), 全为 NaN 处仍为 NaN"""
+    if len(arrs) == 1:
+        return np.array(arrs[0])
+    # 在第一次比较的结果上原地累积, 不堆叠成 k×N 的临时数组
+    out = np.fmax(arrs[0], arrs[1])
+    for arr in arrs[2:]:
+        np.fmax(out, arr, out=out)
+    return out
+
+
+def calculate_atr(high, low, close, period=14):
+    """计算ATR (Average True Range) 波动率指标 (输入输出均为 numpy 数组, 分别传入最高/最低/收盘价)"""
+    high, low, close = (np.asarray(x) for x in (high, low, close))
+    prev_close = np.empty_like(close)
+    prev_close[:1] = np.nan
+    prev_close[1:] = close[:-1]
     
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    atr = tr.rolling(window=period).mean()
+    # 首行 prev_close 为 NaN, 此时真实波幅取 high - low
+    tr = rowwise_max(high - low, np.abs(high - prev_close), np.abs(low - prev_close))
+    atr = _rolling_mean(tr, period)
     
     return atr
 
 
 def calculate_support_resistance(close, period=20):
-    """计算支撑位和阻力位"""
+    """计算支撑位和阻力位 (输入输出均为 numpy 数组)"""
+    close = np.asarray(close)
     # 最近N天的最高点和最低点
-    highest = close.rolling(window=period).max()
-    lowest = close.rolling(window=period).min()
+    highest = _rolling_max(close, period)
+    lowest = _rolling_min(close, period)
     
     # 斐波那契回撤位
     diff = highest - lowest
@@ -110,147 +429,222 @@ def calculate_support_resistance(close, period=20):
 
 
 def calculate_volume_ma(volume, period=20):
-    """计算成交量均线"""
-    return volume.rolling(window=period).mean()
+    """计算成交量均线 (输入输出均为 numpy 数组)"""
+    return _rolling_mean(np.asarray(volume), period)
+
+
+TREND_LABELS = ("横盘整理", "强势上涨", "上涨趋势", "强势下跌", "下跌趋势")
 
 
 def analyze_trend(prices, ma5, ma20, ma60):
-    """分析趋势"""
+    """分析趋势, 返回 TREND_LABELS 下标"""
     if ma5 > ma20 > ma60:
-        return "强势上涨"
+        return 1
     elif ma5 > ma20:
-        return "上涨趋势"
+        return 2
     elif ma5 < ma20 < ma60:
-        return "强势下跌"
+        return 3
     elif ma5 < ma20:
-        return "下跌趋势"
+        return 4
     else:
-        return "横盘整理"
+        return 0
 
 
 def calculate_position_size(atr, price, account_size=100000, risk_percent=2):
     """计算仓位大小"""
+    # 标量 NaN 判断用 math.isnan, 不走 pd.isna 的类型分派
+    if isnan(atr) or atr <= 0:
+        return 0
     risk_amount = account_size * (risk_percent / 100)
     position_size = risk_amount / atr
     return int(position_size)
 
 
-def generate_signal(df, symbol):
-    """生成交易信号"""
-    close = df['Close']
-    volume = df['Volume']
-    high = df['High']
-    low = df['Low']
-    
-    # 计算各项指标
-    rsi = calculate_rsi(close)
-    macd_line, signal_line, histogram = calculate_macd(close)
-    k, d, j = calculate_kdj(high, low, close)
-    ma_dict = calculate_ma(close)
-    ma5, ma20, ma60 = ma_dict['MA5'], ma_dict['MA20'], ma_dict['MA60']
-    upper_band, middle_band, lower_band = calculate_bollinger_bands(close)
-    vol_ma = calculate_volume_ma(volume)
-    atr = calculate_atr(df)
-    sr = calculate_support_resistance(close)
-    
-    # 最新数据
-    latest = df.iloc[-1]
-    latest_rsi = rsi.iloc[-1]
-    latest_macd = macd_line.iloc[-1]
-    latest_signal = signal_line.iloc[-1]
-    latest_hist = histogram.iloc[-1]
-    latest_k = k.iloc[-1]
-    latest_d = d.iloc[-1]
-    latest_j = j.iloc[-1]
-    latest_ma5 = ma5.iloc[-1]
-    latest_ma20 = ma20.iloc[-1]
-    latest_ma60 = ma60.iloc[-1]
-    latest_vol = latest['Volume']
-    latest_close = latest['Close']
-    latest_atr = atr.iloc[-1]
-    latest_sr = {k: v.iloc[-1] for k, v in sr.items()}
-    
-    # 成交量判断
-    vol_ratio = latest_vol / vol_ma.iloc[-1] if vol_ma.iloc[-1] > 0 else 1
-    
-    # 趋势判断
-    trend = analyze_trend(close, latest_ma5, latest_ma20, latest_ma60)
-    
-    # 买卖信号评分 (0-100)
-    buy_score = 0
-    sell_score = 0
-    
-    # RSI评分
-    if latest_rsi < 30:
-        buy_score += 20
-    elif latest_rsi < 40:
-        buy_score += 10
-    elif latest_rsi > 70:
-        sell_score += 20
-    elif latest_rsi > 60:
-        sell_score += 10
-    
-    # MACD评分
-    if latest_hist > 0:
-        buy_score += 15
-    else:
-        sell_score += 15
-    
-    # KDJ评分 (超买超卖更灵敏)
-    if latest_k < 20 or latest_j < 0:
-        buy_score += 15  # 超卖
-    elif latest_k > 80 or latest_j > 100:
-        sell_score += 15  # 超买
-    # 金叉死叉
-    if latest_k > latest_d:
-        buy_score += 10
-    else:
-        sell_score += 10
-    
-    # 均线评分
-    if latest_ma5 > latest_ma20:
-        buy_score += 10
-    else:
-        sell_score += 10
+def _compute_indicators(df):
+    """计算 generate_signal 用到的全部指标, 只返回最新值 (及前一日收盘价)"""
+    # 入口处一次性取出所需列, 之后只做整数下标访问:
+    # 价格用连续的 float32 数组, 减半内存带宽 (get_stock_data/get_many 已转好时不再复制),
+    # 但价格达到 FLOAT32_PRICE_LIMIT 时 float32 精度不到 1 分, 改用 float64;
+    # 成交量数值大, 保留 float64 以免丢精度
+    raw_high = df['High'].to_numpy(copy=False)
+    dtype = np.float32 if raw_high.max() < FLOAT32_PRICE_LIMIT else np.float64
+    close, high, low = (np.ascontiguousarray(df[col].to_numpy(copy=False), dtype=dtype)
+                        for col in ('Close', 'High', 'Low'))
+    volume = np.ascontiguousarray(df['Volume'].to_numpy(copy=False), dtype=np.float64)
     
-    # 成交量评分
-    if vol_ratio > 1.5:
-        if latest_close > close.iloc[-2]:
-            buy_score += 10
-        else:
-            sell_score += 10
+    if NUMBA_AVAILABLE:
+        return dict(zip(LATEST_FIELDS, compute_all(high, low, close, volume)))
     
-    # 趋势评分
-    if trend == "强势上涨":
-        buy_score += 10
-    elif trend == "强势下跌":
-        sell_score += 10
-    elif trend == "上涨趋势":
-        buy_score += 5
-    elif trend == "下跌趋势":
-        sell_score += 5
+    # 未安装 numba 时走 numpy/bottleneck 的逐指标计算
+    k, d, j = calculate_kdj(high, low, close)
+    atr = calculate_atr(high, low, close)
+    macd, macd_signal, macd_hist = macd_last(close)
+    # 布林带 (20, 2) 和支撑/阻力位共用最近 20 天这一个窗口
+    w20 = close[-20:].astype(np.float64)
+    ma20 = w20.mean()
+    bb_std = w20.std(ddof=1)
+    hi20 = w20.max()
+    lo20 = w20.min()
     
-    # 布林带评分
-    if latest_close < lower_band.iloc[-1]:
-        buy_score += 5
-    elif latest_close > upper_band.iloc[-1]:
-        sell_score += 5
+    latest = {
+        'close': close[-1],
+        'prev_close': close[-2],
+        'volume': volume[-1],
+        'rsi': rsi_last(close),
+        'macd': macd,
+        'macd_signal': macd_signal,
+        'macd_hist': macd_hist,
+        'kdj_k': k[-1],
+        'kdj_d': d[-1],
+        'kdj_j': j[-1],
+        'ma5': mean_last(close, 5),
+        'ma20': ma20,
+        'ma60': mean_last(close, 60),
+        'bb_upper': ma20 + 2 * bb_std,
+        'bb_lower': ma20 - 2 * bb_std,
+        'vol_ma': mean_last(volume, 20),
+        'atr': atr[-1],
+        'resistance_1': hi20,
+        'resistance_2': hi20 - (hi20 - lo20) * 0.382,
+        'support_1': lo20,
+        'support_2': lo20 + (hi20 - lo20) * 0.382,
+    }
+    return latest
+
+
+# 指标缓存: 同一只股票的数据没有变化时 (如盘中反复刷新) 直接复用上次的结果
+_INDICATOR_CACHE = OrderedDict()
+_INDICATOR_CACHE_SIZE = 128
+
+
+def get_latest_indicators(df, symbol):
+    """带 LRU 缓存的 _compute_indicators; K线少于 MIN_HISTORY 根时抛出 ValueError"""
+    # compute_all 按固定窗口取末尾数据, 长度不足时负下标会回绕, 算出看似合理的错误值
+    if len(df) < MIN_HISTORY:
+        raise ValueError(f"Need at least {MIN_HISTORY} bars, got {len(df)}")
+    # 盘中最后一根K线的时间戳不变但价格在变, 所以键里要带上最后一行的数值;
+    # 直接取底层数组的最后一行, 比 df.iloc[-1] 构造 Series 再按标签取值快一个数量级
+    key = (symbol, len(df), df.index[-1], tuple(df.to_numpy()[-1]))
+    if key in _INDICATOR_CACHE:
+        _INDICATOR_CACHE.move_to_end(key)
+        return _INDICATOR_CACHE[key]
+    latest = _compute_indicators(df)
+    _INDICATOR_CACHE[key] = latest
+    if len(_INDICATOR_CACHE) > _INDICATOR_CACHE_SIZE:
+        _INDICATOR_CACHE.popitem(last=False)
+    return latest
+
+
+DECISION_LABELS = ("强烈买入", "建议买入", "强烈卖出", "建议卖出", "观望")
+
+# score_signals 特征矩阵的列顺序, 每行对应一只股票
+FEATURE_COLUMNS = ('rsi', 'macd_hist', 'kdj_k', 'kdj_d', 'kdj_j', 'ma5', 'ma20', 'trend',
+                   'close', 'prev_close', 'vol_ratio', 'bb_upper', 'bb_lower')
+
+# 各趋势 (TREND_LABELS 下标) 对应的买入/卖出加分
+TREND_BUY = np.array([0, 10, 5, 0, 0])
+TREND_SELL = np.array([0, 0, 0, 10, 5])
+
+
+@njit((F8_2D,), cache=True)
+def _score(features):
+    """无分支评分: 每条规则写成 条件 * 权重 累加, features 为 (N, len(FEATURE_COLUMNS)) 矩阵"""
+    n = features.shape[0]
+    buy = np.zeros(n, dtype=np.int64)
+    sell = np.zeros(n, dtype=np.int64)
+    for i in range(n):
+        r, hist, k, d, j, ma5, ma20, trend, close, prev_close, vol_ratio, upper, lower = (
+            features[i, 0], features[i, 1], features[i, 2], features[i, 3], features[i, 4],
+            features[i, 5], features[i, 6], features[i, 7], features[i, 8], features[i, 9],
+            features[i, 10], features[i, 11], features[i, 12])
+        macd_up = hist > 0
+        oversold = (k < 20) | (j < 0)
+        overbought = ((k > 80) | (j > 100)) & (1 - oversold)
+        golden = k > d
+        ma_up = ma5 > ma20
+        heavy = vol_ratio > 1.5
+        price_up = close > prev_close
+        below_lower = close < lower
+
+        buy[i] = (20 * (r < 30) + 10 * ((r >= 30) & (r < 40))      # RSI
+                  + 15 * macd_up                                    # MACD
+                  + 15 * oversold + 10 * golden                     # KDJ 超卖 / 金叉
+                  + 10 * ma_up                                      # 均线
+                  + 10 * (heavy & price_up)                         # 放量上涨
+                  + TREND_BUY[int(trend)]                           # 趋势
+                  + 5 * below_lower)                                # 布林带下轨
+        sell[i] = (20 * (r > 70) + 10 * ((r > 60) & (r <= 70))
+                   + 15 * (1 - macd_up)
+                   + 15 * overbought + 10 * (1 - golden)
+                   + 10 * (1 - ma_up)
+                   + 10 * (heavy & (1 - price_up))
+                   + TREND_SELL[int(trend)]
+                   + 5 * ((close > upper) & (1 - below_lower)))
+    return buy, sell
+
+
+def score_signals(features):
+    """批量评分, features 每行为一只股票按 FEATURE_COLUMNS 排列的最新值; 返回 (买入分, 卖出分, DECISION_LABELS 下标)"""
+    buy, sell = _score(np.ascontiguousarray(features, dtype=np.float64))
+    code = np.select([buy >= 55, buy >= 35, sell >= 55, sell >= 35], [0, 1, 2, 3], default=4)
+    return buy, sell, code
+
+
+def _features(ind):
+    """最新指标 -> 按 FEATURE_COLUMNS 排列的一行特征"""
+    return [ind[name] for name in FEATURE_COLUMNS]
+
+
+@dataclass(slots=True)
+class SignalReport:
+    """单只股票的分析结果, 数值保留原始精度, 打印时再格式化"""
+    symbol: str
+    date: str
+    latest_price: float
+    latest_volume: int
+    atr: float
+    atr_percent: float
+    rsi: float
+    kdj_k: float
+    kdj_d: float
+    kdj_j: float
+    macd: float
+    macd_signal: float
+    ma5: float
+    ma20: float
+    ma60: float
+    trend: str
+    volume_ratio: float
+    resistance_1: float
+    resistance_2: float
+    support_1: float
+    support_2: float
+    buy_score: int
+    sell_score: int
+    decision: str
+    position_size: int
+    risk_level: str
+    risk_warning: str
+
+
+def _build_report(symbol, ind, buy_score, sell_score, code, today):
+    """由最新指标和评分结果组装单只股票的 SignalReport"""
+    latest_rsi = ind['rsi']
+    latest_macd = ind['macd']
+    latest_signal = ind['macd_signal']
+    latest_k = ind['kdj_k']
+    latest_d = ind['kdj_d']
+    latest_j = ind['kdj_j']
+    latest_ma5 = ind['ma5']
+    latest_ma20 = ind['ma20']
+    latest_ma60 = ind['ma60']
+    latest_vol = ind['volume']
+    latest_close = ind['close']
+    latest_atr = ind['atr']
     
     # 计算仓位
     position_size = calculate_position_size(latest_atr, latest_close)
     
-    # 生成决策
-    if buy_score >= 55:
-        decision = "强烈买入"
-    elif buy_score >= 35:
-        decision = "建议买入"
-    elif sell_score >= 55:
-        decision = "强烈卖出"
-    elif sell_score >= 35:
-        decision = "建议卖出"
-    else:
-        decision = "观望"
-    
     # 风险评估
     risk_level = "低"
     risk_warning = ""
@@ -261,78 +655,131 @@ def generate_signal(df, symbol):
         risk_level = "中"
         risk_warning = "波动较大，建议轻仓"
     
-    return {
-        "symbol": symbol,
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "latest_price": round(latest_close, 2),
-        "latest_volume": int(latest_vol),
-        "atr": round(latest_atr, 2),
-        "atr_percent": round(latest_atr / latest_close * 100, 2),
-        "rsi": round(latest_rsi, 2),
-        "kdj_k": round(latest_k, 2),
-        "kdj_d": round(latest_d, 2),
-        "kdj_j": round(latest_j, 2),
-        "macd": round(latest_macd, 2),
-        "macd_signal": round(latest_signal, 2),
-        "ma5": round(latest_ma5, 2),
-        "ma20": round(latest_ma20, 2),
-        "ma60": round(latest_ma60, 2),
-        "trend": trend,
-        "volume_ratio": round(vol_ratio, 2),
-        "resistance_1": round(latest_sr['resistance_1'], 2),
-        "resistance_2": round(latest_sr['resistance_2'], 2),
-        "support_1": round(latest_sr['support_1'], 2),
-        "support_2": round(latest_sr['support_2'], 2),
-        "buy_score": buy_score,
-        "sell_score": sell_score,
-        "decision": decision,
-        "position_size": position_size,
-        "risk_level": risk_level,
-        "risk_warning": risk_warning
-    }
+    return SignalReport(
+        symbol=symbol,
+        date=today,
+        latest_price=float(latest_close),
+        latest_volume=int(latest_vol),
+        atr=float(latest_atr),
+        atr_percent=float(latest_atr / latest_close * 100),
+        rsi=float(latest_rsi),
+        kdj_k=float(latest_k),
+        kdj_d=float(latest_d),
+        kdj_j=float(latest_j),
+        macd=float(latest_macd),
+        macd_signal=float(latest_signal),
+        ma5=float(latest_ma5),
+        ma20=float(latest_ma20),
+        ma60=float(latest_ma60),
+        trend=TREND_LABELS[ind['trend']],
+        volume_ratio=float(ind['vol_ratio']),
+        resistance_1=float(ind['resistance_1']),
+        resistance_2=float(ind['resistance_2']),
+        support_1=float(ind['support_1']),
+        support_2=float(ind['support_2']),
+        buy_score=int(buy_score),
+        sell_score=int(sell_score),
+        decision=DECISION_LABELS[code],
+        position_size=position_size,
+        risk_level=risk_level,
+        risk_warning=risk_warning)
+
+
+def _prepare(item):
+    """(symbol, df) -> (symbol, 最新指标及量比/趋势); 历史数据不足时为 None"""
+    symbol, df = item
+    if len(df) < MIN_HISTORY:
+        return symbol, None
+    # 复制一份, 不改动缓存中的指标字典
+    ind = dict(get_latest_indicators(df, symbol))
+    ind['vol_ratio'] = ind['volume'] / ind['vol_ma'] if ind['vol_ma'] > 0 else 1
+    ind['trend'] = analyze_trend(ind['close'], ind['ma5'], ind['ma20'], ind['ma60'])
+    return symbol, ind
+
+
+def build_signals(prepared, today):
+    """对多只股票的最新指标做一次批量评分, 按输入顺序返回 SignalReport, 历史数据不足的为 None"""
+    valid = [(symbol, ind) for symbol, ind in prepared if ind is not None]
+    features = np.array([_features(ind) for _, ind in valid], dtype=np.float64)
+    buy, sell, code = score_signals(features.reshape(len(valid), len(FEATURE_COLUMNS)))
+    reports = {symbol: _build_report(symbol, ind, b, s, c, today)
+               for (symbol, ind), b, s, c in zip(valid, buy, sell, code)}
+    return [reports.get(symbol) for symbol, _ in prepared]
+
+
+def generate_signal(df, symbol, today=None):
+    """生成交易信号 (SignalReport), 历史数据不足时返回 None; today 为报告日期, 缺省取当天"""
+    if today is None:
+        today = datetime.now().strftime("%Y-%m-%d")
+    return build_signals([_prepare((symbol, df))], today)[0]
 
 
 def print_report(data):
     """打印分析报告"""
     print(f"\n{'='*65}")
-    print(f"📊 股票分析报告: {data['symbol']} ({data['date']})")
+    print(f"📊 股票分析报告: {data.symbol} ({data.date})")
     print(f"{'='*65}")
-    print(f"💰 当前价格: ${data['latest_price']}")
-    print(f"📈 成交量: {data['latest_volume']:,} (量比: {data['volume_ratio']})")
-    print(f"📊 ATR波动: {data['atr']} ({data['atr_percent']}%)")
+    print(f"💰 当前价格: ${data.latest_price:.2f}")
+    print(f"📈 成交量: {data.latest_volume:,} (量比: {data.volume_ratio:.2f})")
+    print(f"📊 ATR波动: {data.atr:.2f} ({data.atr_percent:.2f}%)")
     
     print(f"\n📊 技术指标:")
-    print(f"  RSI(14): {data['rsi']}")
-    print(f"  KDJ: K={data['kdj_k']}, D={data['kdj_d']}, J={data['kdj_j']}")
-    print(f"  MACD: {data['macd']} (信号线: {data['macd_signal']})")
-    print(f"  MA5: {data['ma5']}, MA20: {data['ma20']}, MA60: {data['ma60']}")
-    print(f"  趋势: {data['trend']}")
+    print(f"  RSI(14): {data.rsi:.2f}")
+    print(f"  KDJ: K={data.kdj_k:.2f}, D={data.kdj_d:.2f}, J={data.kdj_j:.2f}")
+    print(f"  MACD: {data.macd:.2f} (信号线: {data.macd_signal:.2f})")
+    print(f"  MA5: {data.ma5:.2f}, MA20: {data.ma20:.2f}, MA60: {data.ma60:.2f}")
+    print(f"  趋势: {data.trend}")
     
     print(f"\n🎯 支撑/阻力位:")
-    print(f"  阻力位: ${data['resistance_1']} / ${data['resistance_2']}")
-    print(f"  支撑位: ${data['support_1']} / ${data['support_2']}")
+    print(f"  阻力位: ${data.resistance_1:.2f} / ${data.resistance_2:.2f}")
+    print(f"  支撑位: ${data.support_1:.2f} / ${data.support_2:.2f}")
     
     print(f"\n🎯 决策评分:")
-    print(f"  买入评分: {data['buy_score']}/100")
-    print(f"  卖出评分: {data['sell_score']}/100")
-    print(f"\n💡 最终决策: {data['decision']}")
+    print(f"  买入评分: {data.buy_score}/100")
+    print(f"  卖出评分: {data.sell_score}/100")
+    print(f"\n💡 最终决策: {data.decision}")
     
     print(f"\n📊 仓位建议:")
-    print(f"  建议仓位: {data['position_size']} 股 (风险偏好2%)")
-    print(f"  风险等级: {data['risk_level']}")
-    if data['risk_warning']:
-        print(f"  ⚠️ 风险提示: {data['risk_warning']}")
+    print(f"  建议仓位: {data.position_size} 股 (风险偏好2%)")
+    print(f"  风险等级: {data.risk_level}")
+    if data.risk_warning:
+        print(f"  ⚠️ 风险提示: {data.risk_warning}")
     print(f"{'='*65}\n")
 
 
-def analyze_multiple(symbols):
-    """批量分析多只股票"""
+def analyze_multiple(symbols, max_workers=8, processes=None):
+    """批量分析多只股票, 返回 SignalReport 列表; processes > 1 时用进程池并行计算指标, 评分对全部股票一次完成"""
     results = []
+    # 代码统一大写, 与 yfinance 返回的列名和缓存文件名保持一致
+    symbols = [symbol.upper() for symbol in symbols]
+    # 下载是最慢的一步, 开始前先给出提示; 各股票的报告在全部评分完成后统一输出
+    print(f"📥 正在获取 {len(symbols)} 只股票的数据...")
+    frames = get_many(symbols)
+    # 批量请求中缺失的股票再逐个重试, 用线程池并发拉取
+    missing = [symbol for symbol in symbols if frames[symbol] is None]
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            frames.update(zip(missing, executor.map(get_stock_data, missing)))
+    
+    # 单只股票的指标计算只要零点几毫秒, 和进程间传输 DataFrame 的开销相当,
+    # 因此默认串行; 股票很多且多核时再开启进程池。输出统一在主进程按顺序打印
+    items = [(symbol, frames[symbol]) for symbol in symbols if frames[symbol] is not None]
+    if processes is not None and processes > 1:
+        chunksize = max(1, len(items) // (processes * 4))
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            prepared = list(pool.map(_prepare, items, chunksize=chunksize))
+    else:
+        prepared = [_prepare(item) for item in items]
+    # 所有股票的特征堆成一个矩阵, 一次评分
+    today = datetime.now().strftime("%Y-%m-%d")
+    signals = dict(zip((symbol for symbol, _ in prepared), build_signals(prepared, today)))
+    
     for symbol in symbols:
-        print(f"📥 正在分析 {symbol}...")
-        df = get_stock_data(symbol)
-        if df is not None:
-            result = generate_signal(df, symbol)
+        if symbol in signals:
+            result = signals[symbol]
+            if result is None:
+                print(f"❌ {symbol} 历史数据不足 {MIN_HISTORY} 天, 跳过")
+                continue
             results.append(result)
             print_report(result)
         else: